@@ -1,16 +1,15 @@
 # cogs/media_commands.py
 
 import asyncio
-import json
 import logging
 import random
+import threading
 from datetime import timedelta
-from io import BytesIO
 from pathlib import Path
 
 import aiofiles
-import aiohttp
 import nextcord
+import orjson
 from nextcord import File
 from nextcord.ext import commands, tasks
 import qbittorrentapi
@@ -20,7 +19,7 @@ from utilities import (
     UserMappings,
     NoStopButtonMenuPages,
     MyEmbedDescriptionPageSource,
-    days_hours_minutes,
+    fetch_image,
 )
 from tautulli_wrapper import Tautulli, TMDB
 
@@ -28,6 +27,11 @@ from tautulli_wrapper import Tautulli, TMDB
 logger = logging.getLogger("plexbot.media_commands")
 logger.setLevel(logging.INFO)
 
+DOWNLOAD_FIELD_TEMPLATE = (
+    "**Progress**: {progress:.2f}%, **Size:** {size_gb:.2f} GB, "
+    "**ETA:** {eta_minutes:.0f} minutes, **DL:** {speed_mbps:.2f} MB/s"
+)
+
 
 class MediaCommands(commands.Cog):
     def __init__(self, bot):
@@ -39,6 +43,8 @@ class MediaCommands(commands.Cog):
         self.media_cache = []
         self.cache_lock = asyncio.Lock()
         self.cache_file_path = Path("cache/media_cache.json")
+        self.qbt_client = None
+        self.qbt_lock = threading.Lock()  # get_qbt_client runs in worker threads
         self.bot.loop.create_task(self.initialize())
 
         logger.info("MediaCommands cog initialized.")
@@ -46,18 +52,12 @@ class MediaCommands(commands.Cog):
     async def initialize(self):
         """Asynchronous initializer for the cog."""
         await self.bot.wait_until_ready()
-        await self.tautulli.initialize()
-        if self.tmdb:
-            await self.tmdb.initialize()
         await self.load_cache_from_disk()
         self.update_media_cache.start()
 
     def cog_unload(self):
         self.update_media_cache.cancel()
         self.bot.loop.create_task(self.save_cache_to_disk())
-        self.bot.loop.create_task(self.tautulli.close())
-        if self.tmdb:
-            self.bot.loop.create_task(self.tmdb.close())
 
     @tasks.loop(hours=1)
     async def update_media_cache(self):
@@ -79,16 +79,12 @@ class MediaCommands(commands.Cog):
                 logger.info(
                     f"Fetching media items for library: {library['section_name']} (ID: {library['section_id']})"
                 )
-                response = await self.tautulli.get_library_media_info(
-                    section_id=library["section_id"],
-                    length=10000,  # Adjust as needed
-                    include_metadata=0,  # Since it doesn't include genres
-                )
-                if response.get("response", {}).get("result") != "success":
+                # Genres aren't in the media info, so only the rating keys are used from it
+                media_items = await self.tautulli.get_all_library_media_items(library["section_id"])
+                if media_items is None:
                     logger.error(f"Failed to fetch media info for library {library['section_id']}")
                     continue
 
-                media_items = response.get("response", {}).get("data", {}).get("data", [])
                 if not media_items:
                     logger.info(f"No media items found in library {library['section_name']}")
                     continue
@@ -98,55 +94,34 @@ class MediaCommands(commands.Cog):
                 # Collect the rating keys
                 rating_keys = [item["rating_key"] for item in media_items]
 
-                # Limit the number of concurrent requests
-                semaphore = asyncio.Semaphore(10)  # Limit to 10 concurrent requests
-
-                # Define an async function to fetch metadata for an item
-                async def fetch_item_metadata(rating_key):
-                    async with semaphore:
-                        logger.debug(f"Fetching metadata for rating_key: {rating_key}")
-                        try:
-                            metadata_response = await self.tautulli.get_metadata(rating_key=rating_key)
-                            if (
-                                metadata_response
-                                and metadata_response.get("response", {}).get("result") == "success"
-                            ):
-                                metadata = metadata_response.get("response", {}).get("data", {})
-                                genres = [genre.lower() for genre in metadata.get("genres", [])]
-
-                                item_data = {
-                                    "rating_key": rating_key,
-                                    "title": metadata.get("title") or "Unknown Title",
-                                    "media_type": (metadata.get("media_type") or "unknown").lower(),
-                                    "genres": genres,
-                                    "thumb": metadata.get("thumb"),
-                                    "year": metadata.get("year"),
-                                    "play_count": metadata.get("play_count", 0),
-                                    "last_played": metadata.get("last_played"),
-                                    "summary": metadata.get("summary", ""),
-                                    "rating": metadata.get("rating", ""),
-                                }
-                                logger.debug(f"Metadata fetched for rating_key: {rating_key}")
-                                return item_data
-                            else:
-                                logger.error(f"Failed to fetch metadata for rating_key {rating_key}")
-                                return None
-                        except Exception as e:
-                            logger.error(f"Exception while fetching metadata for {rating_key}: {e}")
-                            return None
-
-                # Use asyncio.gather to fetch metadata concurrently with exception handling
-                tasks_list = [fetch_item_metadata(rating_key) for rating_key in rating_keys]
-                results = await asyncio.gather(*tasks_list, return_exceptions=True)
-
-                # Handle exceptions and filter out None results
-                for idx, result in enumerate(results):
-                    if isinstance(result, Exception):
-                        logger.error(
-                            f"Exception occurred while fetching metadata for rating_key {rating_keys[idx]}: {result}"
-                        )
-                    elif result:
-                        all_media_items.append(result)
+                # Fetch the metadata for every item, at most 10 requests at a time
+                responses = await self.tautulli.fetch_many(
+                    [("get_metadata", {"rating_key": rating_key}) for rating_key in rating_keys],
+                    concurrency=10,
+                )
+
+                for rating_key, metadata_response in zip(rating_keys, responses):
+                    if (
+                        not metadata_response
+                        or metadata_response.get("response", {}).get("result") != "success"
+                    ):
+                        logger.error(f"Failed to fetch metadata for rating_key {rating_key}")
+                        continue
+                    metadata = metadata_response.get("response", {}).get("data", {})
+                    all_media_items.append(
+                        {
+                            "rating_key": rating_key,
+                            "title": metadata.get("title") or "Unknown Title",
+                            "media_type": (metadata.get("media_type") or "unknown").lower(),
+                            "genres": [genre.lower() for genre in metadata.get("genres", [])],
+                            "thumb": metadata.get("thumb"),
+                            "year": metadata.get("year"),
+                            "play_count": metadata.get("play_count", 0),
+                            "last_played": metadata.get("last_played"),
+                            "summary": metadata.get("summary", ""),
+                            "rating": metadata.get("rating", ""),
+                        }
+                    )
 
                 # Yield control to the event loop
                 await asyncio.sleep(0)
@@ -163,8 +138,8 @@ class MediaCommands(commands.Cog):
         cache_dir.mkdir(parents=True, exist_ok=True)
         try:
             logger.info(f"Saving media cache to {self.cache_file_path}")
-            async with aiofiles.open(self.cache_file_path, "w", encoding="utf-8") as f:
-                data_to_write = json.dumps(self.media_cache, ensure_ascii=False, indent=4)
+            async with aiofiles.open(self.cache_file_path, "wb") as f:
+                data_to_write = await asyncio.to_thread(orjson.dumps, self.media_cache)
                 await f.write(data_to_write)
                 logger.debug(f"Data to write: {data_to_write[:100]}...")  # Log first 100 chars
             logger.info(f"Media cache saved to {self.cache_file_path}")
@@ -176,9 +151,9 @@ class MediaCommands(commands.Cog):
         if self.cache_file_path.exists():
             async with self.cache_lock:
                 try:
-                    async with aiofiles.open(self.cache_file_path, "r", encoding="utf-8") as f:
+                    async with aiofiles.open(self.cache_file_path, "rb") as f:
                         contents = await f.read()
-                        self.media_cache = json.loads(contents)
+                        self.media_cache = await asyncio.to_thread(orjson.loads, contents)
                     logger.info(f"Media cache loaded from {self.cache_file_path}")
                 except Exception as e:
                     logger.exception("Failed to load media cache from disk.")
@@ -329,20 +304,18 @@ class MediaCommands(commands.Cog):
                 thumb_url = self.construct_image_url(item["thumb"])
                 if thumb_url:
                     try:
-                        async with aiohttp.ClientSession() as session:
-                            async with session.get(thumb_url) as response:
-                                if response.status == 200:
-                                    image_data = BytesIO(await response.read())
-                                    file = File(fp=image_data, filename="image.jpg")
-                                    embed.set_image(url="attachment://image.jpg")
-                                    await ctx.send(file=file, embed=embed)
-                                    return
-                                else:
-                                    embed.add_field(
-                                        name="Image",
-                                        value="Failed to retrieve image.",
-                                        inline=False,
-                                    )
+                        image_data = await fetch_image(thumb_url)
+                        if image_data:
+                            file = File(fp=image_data, filename="image.jpg")
+                            embed.set_image(url="attachment://image.jpg")
+                            await ctx.send(file=file, embed=embed)
+                            return
+                        else:
+                            embed.add_field(
+                                name="Image",
+                                value="Failed to retrieve image.",
+                                inline=False,
+                            )
                     except Exception as e:
                         logger.error(f"Failed to retrieve thumbnail image: {e}")
                         embed.add_field(
@@ -360,10 +333,7 @@ class MediaCommands(commands.Cog):
     def construct_image_url(self, thumb_key):
         """Construct the full image URL for thumbnails."""
         if thumb_key:
-            tautulli_ip = self.tautulli.tautulli_ip
-            return (
-                f"http://{tautulli_ip}/pms_image_proxy?img={thumb_key}&width=300&height=450&fallback=poster"
-            )
+            return self.tautulli.pms_image_proxy(thumb_key)
         return ""
 
     async def get_libraries(self, media_type=None):
@@ -407,10 +377,10 @@ class MediaCommands(commands.Cog):
                 return
 
             # Load ignored users list
-            user_data = UserMappings.load_user_mappings()
-            ignored_users = {user["plex_username"] for user in user_data if user.get("ignore", False)}
+            ignored_users = UserMappings.get_ignored_usernames()
 
             total_watchers = 0
+            state_symbols = {"Playing": "▶️", "Paused": "⏸️"}
             embed = nextcord.Embed(title="Plex Watchers", color=self.plex_embed_color)
             embed.set_thumbnail(url=self.plex_image)
 
@@ -420,10 +390,7 @@ class MediaCommands(commands.Cog):
 
                 total_watchers += 1
                 state = user.get("state", "unknown").capitalize()
-                state_symbol = {
-                    "Playing": "▶️",
-                    "Paused": "⏸️",
-                }.get(state, state)
+                state_symbol = state_symbols.get(state, state)
 
                 view_offset = int(user.get("view_offset", 0))
                 elapsed_time = str(timedelta(milliseconds=view_offset))
@@ -446,30 +413,55 @@ class MediaCommands(commands.Cog):
             logger.error(f"Failed to retrieve watchers: {e}")
             await ctx.send("Failed to retrieve watchers.")
 
+    def get_qbt_client(self):
+        """Return the shared qBittorrent client, creating and logging it in on first use."""
+        with self.qbt_lock:
+            if self.qbt_client is None:
+                self.qbt_client = self.create_qbt_client()
+        return self.qbt_client
+
+    def create_qbt_client(self):
+        """Create a qBittorrent client from the configuration and log it in."""
+        config_data = Config.load_config()
+        logger.debug(
+            "Creating qbittorrent Client with IP=%s, Port=%s, Username=%s",
+            config_data["qbit_ip"],
+            config_data["qbit_port"],
+            config_data["qbit_username"],
+        )
+        qbt_client = qbittorrentapi.Client(
+            host=f"{config_data['qbit_ip']}",
+            port=f"{config_data['qbit_port']}",
+            username=f"{config_data['qbit_username']}",
+            password=f"{config_data['qbit_password']}",
+        )
+
+        # (Only if your version needs an explicit login)
+        qbt_client.auth_log_in()
+        logger.debug("Successfully logged into qBittorrent? %s", qbt_client.is_logged_in)
+        return qbt_client
+
+    def fetch_downloading_torrents(self):
+        """Fetch active downloads, reconnecting once if the qBittorrent session has dropped."""
+        try:
+            torrents = self.get_qbt_client().torrents.info.downloading()
+        except Exception as e:
+            logger.warning(f"qBittorrent request failed ({e}); reconnecting.")
+            self.qbt_client = None
+            torrents = self.get_qbt_client().torrents.info.downloading()
+        return [
+            t
+            for t in torrents
+            if t.state not in ["pausedDL", "pausedUP", "stopped"] and not t.state_enum.is_paused
+        ]
+
     @commands.command()
     async def downloading(self, ctx):
         ### Display the current downloading torrents in qBittorrent.
-        # Try to instantiate the qBittorrent client
+        # Reuse the qBittorrent client, creating it on first use
 
         try:
-            config_data = Config.load_config()
-            logger.debug(
-                "Creating qbittorrent Client with IP=%s, Port=%s, Username=%s",
-                config_data["qbit_ip"],
-                config_data["qbit_port"],
-                config_data["qbit_username"],
-            )
-            qbt_client = qbittorrentapi.Client(
-                host=f"{config_data['qbit_ip']}",
-                port=f"{config_data['qbit_port']}",
-                username=f"{config_data['qbit_username']}",
-                password=f"{config_data['qbit_password']}",
-            )
-
-            # (Only if your version needs an explicit login)
-            qbt_client.auth_log_in()
-            logger.debug("Successfully logged into qBittorrent? %s", qbt_client.is_logged_in)
-
+            await asyncio.to_thread(self.get_qbt_client)
         except Exception as err:
             logger.exception(
                 "Couldn't open connection to qbittorrent. Check qBit JSON values or network accessibility."
@@ -478,47 +470,50 @@ class MediaCommands(commands.Cog):
             return
 
         # Pull downloading torrents
-        num_downloads = 0
-        downloads_embed = nextcord.Embed(
-            title="qBittorrent Live Downloads",
-            color=0x6C81DF,
-        )
-        downloads_embed.set_thumbnail(
-            url="https://upload.wikimedia.org/wikipedia/commons/thumb/6/66/New_qBittorrent_Logo.svg/1200px-New_qBittorrent_Logo.svg.png"
-        )
-
         try:
-            # Get all downloading torrents
-            torrents_downloading = [
-                t
-                for t in qbt_client.torrents.info.downloading()
-                if t.state not in ["pausedDL", "pausedUP", "stopped"] and not t.state_enum.is_paused
-            ]
+            # Get all downloading torrents; qbittorrentapi is synchronous, so keep it off the loop
+            torrents_downloading = await asyncio.to_thread(self.fetch_downloading_torrents)
             logger.debug("Fetched %d torrents in downloading status.", len(torrents_downloading))
         except Exception as e:
             logger.exception("Error retrieving downloading torrents.")
             await ctx.send("I'm having trouble retrieving the downloading torrents.")
             return
 
+        # Discord allows at most 25 fields per embed, 256 characters per field name and
+        # 6000 characters in total, so keep room for the overflow footer within that budget
+        title = "qBittorrent Live Downloads"
+        max_fields = 25
+        budget = 6000 - len(title) - len(f"…and {len(torrents_downloading)} more")
+        fields = []
         for download in torrents_downloading:
-            downloads_embed.add_field(
-                name=f"⏳ {download.name}",
-                value=(
-                    f"**Progress**: {download.progress * 100:.2f}%, "
-                    f"**Size:** {download.size * 1e-9:.2f} GB, "
-                    f"**ETA:** {download.eta / 60:.0f} minutes, "
-                    f"**DL:** {download.dlspeed * 1.0e-6:.2f} MB/s"
-                ),
-                inline=False,
+            if len(fields) == max_fields:
+                break
+            name = f"⏳ {download.name}"[:256]
+            value = DOWNLOAD_FIELD_TEMPLATE.format(
+                progress=download.progress * 100,
+                size_gb=download.size / 1e9,
+                eta_minutes=download.eta / 60,
+                speed_mbps=download.dlspeed / 1e6,
             )
-            num_downloads += 1
+            budget -= len(name) + len(value)
+            if budget < 0:
+                break
+            fields.append((name, value))
+        hidden_downloads = len(torrents_downloading) - len(fields)
+        if not fields:
+            fields.append(("\u200b", "There is no movie currently downloading!"))
 
-        if num_downloads < 1:
-            downloads_embed.add_field(
-                name="\u200b",
-                value="There is no movie currently downloading!",
-                inline=False,
-            )
+        downloads_embed = nextcord.Embed(
+            title=title,
+            color=0x6C81DF,
+        )
+        downloads_embed.set_thumbnail(
+            url="https://upload.wikimedia.org/wikipedia/commons/thumb/6/66/New_qBittorrent_Logo.svg/1200px-New_qBittorrent_Logo.svg.png"
+        )
+        for name, value in fields:
+            downloads_embed.add_field(name=name, value=value, inline=False)
+        if hidden_downloads:
+            downloads_embed.set_footer(text=f"…and {hidden_downloads} more")
 
         await ctx.send(embed=downloads_embed)
 
@@ -527,6 +522,8 @@ class MediaCommands(commands.Cog):
     async def refresh_cache(self, ctx):
         """Manually refresh the media cache."""
         await ctx.send("Refreshing media cache...")
+        # Start from fresh library data rather than cached responses
+        self.tautulli.clear_cache()
         async with self.cache_lock:
             self.media_cache = await self.fetch_all_media_items()
             await self.save_cache_to_disk()
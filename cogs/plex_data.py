@@ -6,9 +6,6 @@ import nextcord
 from nextcord.ext import commands
 from io import BytesIO
 
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
 import pytz
 import tzlocal
 import datetime
@@ -20,6 +17,18 @@ from utilities import UserMappings
 logger = logging.getLogger("plexbot.data")
 logger.setLevel(logging.INFO)
 
+# pandas, matplotlib and seaborn take seconds to import, so they're loaded on first use
+pd = plt = sns = None
+
+
+def load_charting_modules():
+    """Import the charting libraries the first time a chart command needs them."""
+    global pd, plt, sns
+    if pd is None:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        import pandas as pd
+
 
 class Data(commands.Cog):
     def __init__(self, bot):
@@ -220,6 +229,9 @@ class Data(commands.Cog):
 
     async def fetch_watch_history_with_genres(self, ctx, member: nextcord.Member = None, days: int = 30):
         """Fetches the watch history and pairs it with genre data from the media cache."""
+        # Every chart command starts here, so this is where the charting libraries get loaded
+        await asyncio.to_thread(load_charting_modules)
+
         # Get the timezone if not already set
         if self.timezone is None:
             self.timezone = await self.get_tautulli_timezone()
@@ -266,6 +278,11 @@ class Data(commands.Cog):
         # Pair history entries with genres from media cache
         data = []
         async with cache_lock:
+            # Index the cache once so each history entry finds its media item in O(1)
+            media_by_key = {}
+            for item in media_cache:
+                media_by_key.setdefault(str(item.get("rating_key")), item)
+
             for entry in history_entries:
                 # Get the timestamp and localize it
                 timestamp = entry.get("started")
@@ -301,13 +318,10 @@ class Data(commands.Cog):
                 genres = []
                 media_item = None
                 for key in rating_keys:
-                    if key:
-                        media_item = next(
-                            (item for item in media_cache if str(item.get("rating_key")) == key), None
-                        )
-                        if media_item:
-                            genres = media_item.get("genres", [])
-                            break
+                    media_item = media_by_key.get(key)
+                    if media_item:
+                        genres = media_item.get("genres", [])
+                        break
 
                 data.append(
                     {
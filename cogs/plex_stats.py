@@ -1,5 +1,6 @@
 # cogs/plex_stats.py
 
+import asyncio
 import logging
 from datetime import timedelta
 
@@ -24,47 +25,54 @@ class PlexStats(commands.Cog):
     @commands.command()
     async def top(self, ctx, set_default: int = None):
         """Displays top Plex users or sets the default duration for displaying stats."""
+        config_data = Config.load_config()
         if set_default is not None:
-            config_data = Config.load_config()
-            config_data["default_duration"] = set_default
-            Config.save_config(config_data)
+            # Only rewrite config.json when the default actually changes
+            if config_data.get("default_duration") != set_default:
+                config_data["default_duration"] = set_default
+                await Config.save_config_async(config_data)
             await ctx.send(f"Default duration set to: **{set_default}** days.")
             logger.info(f"Default duration set to {set_default} days.")
             return
 
-        config_data = Config.load_config()
         duration = config_data.get("default_duration", 7)
-        response = await self.tautulli.get_home_stats(
-            params={
-                "stats_type": "duration",
-                "stat_id": "top_users",
-                "stats_count": "10",
-                "time_range": duration,
-            }
+        # The footer's all-time total comes from the history, so fetch both at once
+        response, history_data = await asyncio.gather(
+            self.tautulli.get_home_stats(
+                params={
+                    "stats_type": "duration",
+                    "stat_id": "top_users",
+                    "stats_count": "10",
+                    "time_range": duration,
+                }
+            ),
+            self.tautulli.get_history(),
         )
         if not response or response.get("response", {}).get("result") != "success":
             await ctx.send("Failed to retrieve top users.")
             logger.error("Failed to retrieve top users from Tautulli.")
             return
 
-        embed = nextcord.Embed(title=f"Plex Top (last {duration} days)", color=self.plex_embed_color)
+        fields = []
         total_watchtime = 0
-        user_data = UserMappings.load_user_mappings()
-        ignored_users = {user["plex_username"]: user for user in user_data if user.get("ignore", False)}
+        ignored_users = UserMappings.get_ignored_usernames()
+        get_mapping = UserMappings.get_mapping_by_plex_username
+        # Tautulli can return more rows than asked for; only ten fit in the embed
+        rows = response["response"]["data"]["rows"][:10]
 
         top_users = {}
-        for rank, entry in enumerate(response["response"]["data"]["rows"], 1):
+        rank = 0
+        for entry in rows:
             username = entry["user"]
             if username in ignored_users:
                 continue
 
+            # Rank only the users that are shown, so an ignored user doesn't leave a gap
+            rank += 1
             if rank <= 3:
-                discord_id = next(
-                    (user["discord_id"] for user in user_data if user.get("plex_username") == username),
-                    None,
-                )
-                if discord_id:
-                    top_users[rank] = discord_id
+                mapping = get_mapping(username)
+                if mapping and mapping.get("discord_id"):
+                    top_users[rank] = mapping["discord_id"]
             watch_time_seconds = entry["total_duration"]
             total_watchtime += watch_time_seconds
             watch_time = utils.days_hours_minutes(watch_time_seconds)
@@ -75,26 +83,27 @@ class PlexStats(commands.Cog):
                 else entry.get("grandparent_title", "No recent activity")
             )
 
-            embed.add_field(
-                name=f"#{rank} {username}",
-                value=f"{watch_time}\n**{media}**",
-                inline=True,
-            )
+            fields.append((f"#{rank} {username}", f"{watch_time}\n**{media}**"))
 
-        if not top_users:
+        if not fields:
             await ctx.send("No top users found or all are ignored.")
             logger.info("No top users found or all are ignored.")
             return
 
+        embed = nextcord.Embed(title=f"Plex Top (last {duration} days)", color=self.plex_embed_color)
+        for name, value in fields:
+            embed.add_field(name=name, value=value, inline=True)
         total_watch_time_str = utils.days_hours_minutes(total_watchtime)
-        history_data = await self.tautulli.get_history()
         total_duration_all_time = history_data["response"]["data"]["total_duration"]
         embed.set_footer(
             text=f"Total Watchtime: {total_watch_time_str}\nAll time: {total_duration_all_time}"
         )
 
-        await ctx.send(embed=embed)
-        await self.clean_roles(ctx, top_users)
+        if top_users:
+            # Role updates don't affect the embed, so don't hold the reply back for them
+            await asyncio.gather(ctx.send(embed=embed), self.clean_roles(ctx, top_users))
+        else:
+            await ctx.send(embed=embed)
 
     async def clean_roles(self, ctx, top_users):
         """Remove roles based on new top users and reassign correctly."""
@@ -120,15 +129,17 @@ class PlexStats(commands.Cog):
             if role:
                 members_with_roles.update(role.members)
         # Remove all roles from members who should no longer have them
-        for member in members_with_roles:
-            if member.id not in top_users.values():
-                try:
-                    await member.remove_roles(*roles, reason="Removing non-top user roles.")
-                    logger.info(f"Removed roles from {member.display_name}.")
-                except Exception as e:
-                    logger.error(f"Failed to remove roles from {member.display_name}: {e}")
+        top_user_ids = {int(user_id) for user_id in top_users.values()}
+        await asyncio.gather(
+            *(
+                self.remove_top_roles(member, roles)
+                for member in members_with_roles
+                if member.id not in top_user_ids
+            )
+        )
 
         # Assign the correct roles to the new top users
+        assignments = []
         for rank, user_id in top_users.items():
             member = ctx.guild.get_member(int(user_id))
             if not member:
@@ -136,16 +147,36 @@ class PlexStats(commands.Cog):
                 continue
 
             if rank <= len(roles):
-                correct_role = roles[rank - 1]
-                roles_to_remove = [role for role in roles if role != correct_role]
-                try:
-                    await member.add_roles(correct_role, reason="Assigning new top user role.")
-                    await member.remove_roles(*roles_to_remove, reason="Cleaning up other top roles.")
-                    logger.info(
-                        f"Assigned role '{correct_role.name}' to {member.display_name} and removed other top roles."
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to assign roles to {member.display_name}: {e}")
+                assignments.append(self.assign_top_role(member, roles[rank - 1], roles))
+        await asyncio.gather(*assignments)
+
+    async def remove_top_roles(self, member, roles):
+        """Remove every top role from a member who is no longer a top user."""
+        held_roles = [role for role in roles if role in member.roles]
+        if not held_roles:
+            return
+        try:
+            await member.remove_roles(*held_roles, reason="Removing non-top user roles.")
+            logger.info(f"Removed roles from {member.display_name}.")
+        except Exception as e:
+            logger.error(f"Failed to remove roles from {member.display_name}: {e}")
+
+    async def assign_top_role(self, member, correct_role, roles):
+        """Give a top user their rank's role and remove the other top roles."""
+        # Only touch roles that actually need to change, to save Discord API calls
+        roles_to_remove = [role for role in roles if role != correct_role and role in member.roles]
+        if correct_role in member.roles and not roles_to_remove:
+            return
+        try:
+            if correct_role not in member.roles:
+                await member.add_roles(correct_role, reason="Assigning new top user role.")
+            if roles_to_remove:
+                await member.remove_roles(*roles_to_remove, reason="Cleaning up other top roles.")
+            logger.info(
+                f"Assigned role '{correct_role.name}' to {member.display_name} and removed other top roles."
+            )
+        except Exception as e:
+            logger.error(f"Failed to assign roles to {member.display_name}: {e}")
 
     @commands.command()
     async def stats(self, ctx, time: int = 30):
@@ -156,9 +187,15 @@ class PlexStats(commands.Cog):
             time = int(time)
         try:
             # Fetching data for the top three most watched movies and shows
-            most_watched_movies_response = await self.tautulli.get_most_watched_movies(time_range=time)
-            most_watched_shows_response = await self.tautulli.get_most_watched_shows(time_range=time)
-            libraries_response = await self.tautulli.get_libraries_table()
+            (
+                most_watched_movies_response,
+                most_watched_shows_response,
+                libraries_response,
+            ) = await asyncio.gather(
+                self.tautulli.get_most_watched_movies(time_range=time),
+                self.tautulli.get_most_watched_shows(time_range=time),
+                self.tautulli.get_libraries_table(),
+            )
 
             total_movies = 0
             total_shows = 0
@@ -224,14 +261,18 @@ class PlexStats(commands.Cog):
             # Get all TV libraries
             response = await self.tautulli.get_libraries()
             libraries = response["response"]["data"]
-            tv_libraries = (library for library in libraries if library["section_type"] == "show")
+            tv_libraries = [library for library in libraries if library["section_type"] == "show"]
 
-            # Get library user stats for each TV library
+            # Get library user stats for every TV library at once
+            responses = await asyncio.gather(
+                *(
+                    self.tautulli.get_library_user_stats(section_id=library["section_id"])
+                    for library in tv_libraries
+                )
+            )
             top_users = {}
-            for library in tv_libraries:
-                section_id = library["section_id"]
+            for library, response in zip(tv_libraries, responses):
                 library_name = library["section_name"]
-                response = await self.tautulli.get_library_user_stats(section_id=section_id)
                 data = response["response"]["data"]
                 for user_data in data:
                     username = user_data["username"]
@@ -288,33 +329,27 @@ class PlexStats(commands.Cog):
                 # If not a member, assume it's a Plex username
                 plex_username = identifier
 
-        response = await self.tautulli.get_history()
-        if response["response"]["result"] != "success":
-            await ctx.send("Failed to retrieve watch history from Plex.")
-            logger.error("Failed to retrieve watch history from Tautulli.")
-            return
-
-        user_data = UserMappings.load_user_mappings()
-
         if member:
-            # Find Plex username by Discord member ID
-            plex_user = next(
-                (item for item in user_data if str(item.get("discord_id")) == str(member.id)),
-                None,
-            )
-
-            if not plex_user:
+            # Find Plex username by Discord member ID before querying Tautulli
+            plex_user = UserMappings.get_mapping_by_discord_id(str(member.id))
+            if plex_user is None:
                 await ctx.send("The specified member is not mapped to a Plex user.")
                 logger.warning(f"Member {member.display_name} not mapped to a Plex user.")
                 return
 
             plex_username = plex_user.get("plex_username")
 
-        # Show all history if no specific user is specified
+        # Let Tautulli filter by user; show all history if no specific user is specified
+        params = {"user": plex_username} if plex_username else None
+        response = await self.tautulli.get_history(params=params)
+        if response["response"]["result"] != "success":
+            await ctx.send("Failed to retrieve watch history from Plex.")
+            logger.error("Failed to retrieve watch history from Tautulli.")
+            return
+
         last_watched_list = [
             f"<t:{entry['date']}:t> {entry['full_title']} ({entry['duration'] // 60}m {entry['duration'] % 60}s) by {entry['user']}"
             for entry in response["response"]["data"]["data"]
-            if not plex_username or entry["user"] == plex_username
         ]
 
         embed = nextcord.Embed(title="Plex Stats", color=self.plex_embed_color)
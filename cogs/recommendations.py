@@ -7,11 +7,9 @@ import asyncio
 import nextcord
 from nextcord.ext import commands
 
-from utilities import UserMappings
+from utilities import UserMappings, fetch_image
 from tautulli_wrapper import Tautulli
 
-import aiohttp
-from io import BytesIO
 from nextcord import File
 
 # Configure logging for this module
@@ -93,7 +91,8 @@ class Recommendations(commands.Cog):
                 if entry.get(key):
                     watched_rating_keys.add(str(entry[key]))
 
-        logger.debug(f"Watched rating keys: {watched_rating_keys}")
+        # Lazy %-formatting: these sets can hold thousands of keys and debug is normally off
+        logger.debug("Watched rating keys: %s", watched_rating_keys)
 
         # Collect genres from watch history using media cache
         watched_genres = []
@@ -107,7 +106,7 @@ class Recommendations(commands.Cog):
                 if any(key in watched_rating_keys for key in item_keys) and item.get("genres"):
                     watched_genres.extend(item["genres"])
 
-        logger.debug(f"Watched genres: {watched_genres}")
+        logger.debug("Watched genres: %s", watched_genres)
 
         if not watched_genres:
             await ctx.send(f"Could not determine watched genres for {member.display_name}.")
@@ -153,11 +152,12 @@ class Recommendations(commands.Cog):
         selected_recommendations = recommendations[:3]
 
         # Get the number of unique users who watched each recommendation
-        user_counts = []
-        for item in selected_recommendations:
-            rating_key = item.get("rating_key")
-            watched_users = await self.get_watched_users(rating_key, return_count=True)
-            user_counts.append(watched_users)
+        user_counts = await asyncio.gather(
+            *(
+                self.get_watched_users(item.get("rating_key"), return_count=True)
+                for item in selected_recommendations
+            )
+        )
 
         # Create and send an embed with recommendations
         embed = nextcord.Embed(
@@ -310,23 +310,21 @@ class Recommendations(commands.Cog):
             thumb_url = self.construct_image_url(thumb)
             if thumb_url:
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(thumb_url) as response:
-                            if response.status == 200:
-                                image_data = BytesIO(await response.read())
-                                file = nextcord.File(fp=image_data, filename="image.jpg")
-                                embed.set_image(url="attachment://image.jpg")
-                                # Send a new message with the embed and file
-                                if detailed_message:
-                                    await detailed_message.delete()
-                                detailed_message = await ctx.send(embed=embed, file=file)
-                                return detailed_message
-                            else:
-                                embed.add_field(
-                                    name="Image",
-                                    value="Failed to retrieve image.",
-                                    inline=False,
-                                )
+                    image_data = await fetch_image(thumb_url)
+                    if image_data:
+                        file = nextcord.File(fp=image_data, filename="image.jpg")
+                        embed.set_image(url="attachment://image.jpg")
+                        # Send a new message with the embed and file
+                        if detailed_message:
+                            await detailed_message.delete()
+                        detailed_message = await ctx.send(embed=embed, file=file)
+                        return detailed_message
+                    else:
+                        embed.add_field(
+                            name="Image",
+                            value="Failed to retrieve image.",
+                            inline=False,
+                        )
                 except Exception as e:
                     logger.error(f"Failed to retrieve thumbnail image: {e}")
                     embed.add_field(
@@ -346,41 +344,46 @@ class Recommendations(commands.Cog):
     def construct_image_url(self, thumb_key):
         """Construct the full image URL for thumbnails."""
         if thumb_key:
-            tautulli_ip = self.tautulli.tautulli_ip
-            return (
-                f"http://{tautulli_ip}/pms_image_proxy?img={thumb_key}&width=300&height=450&fallback=poster"
-            )
+            return self.tautulli.pms_image_proxy(thumb_key)
         return ""
 
     async def get_watched_users(self, rating_key, exclude_user=None, return_count=False):
         """Retrieve a list of Discord usernames who have watched the media item."""
+        if rating_key is None:
+            return [] if not return_count else 0
         user_stats_response = await self.tautulli.get_item_user_stats(rating_key)
 
-        if user_stats_response["response"]["result"] != "success":
+        if not user_stats_response or user_stats_response["response"]["result"] != "success":
             logger.error(f"Failed to retrieve user stats for rating_key {rating_key}.")
             return [] if not return_count else 0
 
         user_stats = user_stats_response["response"]["data"]
 
-        watched_users = []
+        discord_ids = []
         for user_stat in user_stats:
             plex_username = user_stat.get("username")
             if exclude_user and plex_username == exclude_user:
                 continue  # Exclude the requesting user
             user_mapping = UserMappings.get_mapping_by_plex_username(plex_username)
-            if user_mapping and not user_mapping.get("ignore", False):
-                discord_id = user_mapping.get("discord_id")
-                try:
-                    discord_user = self.bot.get_user(int(discord_id))
-                    if discord_user is None:
-                        discord_user = await self.bot.fetch_user(int(discord_id))
-                    if discord_user:
-                        watched_users.append(discord_user.display_name)
-                except Exception as e:
-                    logger.error(f"Failed to fetch Discord user with ID {discord_id}: {e}")
+            if user_mapping and not user_mapping.get("ignore", False) and user_mapping.get("discord_id"):
+                discord_ids.append(user_mapping["discord_id"])
         if return_count:
-            return len(watched_users)
-        return watched_users
+            # A count doesn't need Discord names, so skip the user lookups
+            return len(discord_ids)
+
+        discord_users = await asyncio.gather(*(self.get_discord_user(d) for d in discord_ids))
+        return [discord_user.display_name for discord_user in discord_users if discord_user]
+
+    async def get_discord_user(self, discord_id):
+        """Get a Discord user from the bot's cache, fetching it from Discord only on a miss."""
+        try:
+            discord_user = self.bot.get_user(int(discord_id))
+            if discord_user is None:
+                discord_user = await self.bot.fetch_user(int(discord_id))
+            return discord_user
+        except Exception as e:
+            logger.error(f"Failed to fetch Discord user with ID {discord_id}: {e}")
+            return None
 
 
 def setup(bot):
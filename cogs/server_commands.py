@@ -1,17 +1,19 @@
 # cogs/server_commands.py
 
 import asyncio
+import itertools
 import logging
-from datetime import timedelta
 
-import aiohttp
 import nextcord
+import orjson
 from nextcord.ext import commands
 
 from utilities import (
     Config,
-    get_git_revision_short_hash,
-    get_git_revision_short_hash_latest,
+    HttpSession,
+    get_git_revision_hash,
+    get_git_revision_hash_latest,
+    short_git_hash,
 )
 from tautulli_wrapper import Tautulli
 
@@ -30,40 +32,45 @@ class ServerCommands(commands.Cog):
 
     async def initialize(self):
         await self.bot.wait_until_ready()
-        await self.tautulli.initialize()
         self.bot.loop.create_task(self.status_task())
 
-    def cog_unload(self):
-        self.bot.loop.create_task(self.tautulli.close())
-
     async def status_task(self):
         """Background task to update the bot's presence."""
-        display_streams = True  # Toggles between showing streams and help command
+        help_activity = nextcord.Activity(type=nextcord.ActivityType.listening, name=": plex help")
+
+        def streams_activity(stream_count, wan_bandwidth_mbps):
+            if not stream_count:
+                return help_activity  # Nothing streaming; keep showing the help text
+            return nextcord.Activity(
+                type=nextcord.ActivityType.playing,
+                name=f"{stream_count} streams at {wan_bandwidth_mbps} mbps",
+            )
+
+        # Alternate between showing streams and the help command
+        presences = itertools.cycle((streams_activity, lambda *_: help_activity))
+        last_sent = None  # Last presence sent to Discord, to skip identical updates
+        min_interval, max_interval = 15, 300
+        interval = min_interval
         while not self.bot.is_closed():
             try:
                 response = await self.tautulli.get_activity()
-                if response.get("response", {}).get("result") != "success":
+                if not response or response.get("response", {}).get("result") != "success":
                     logger.error("Failed to retrieve activity from Tautulli.")
-                    await asyncio.sleep(15)
+                    await asyncio.sleep(interval)
                     continue
                 stream_count = response["response"]["data"]["stream_count"]
                 wan_bandwidth_mbps = round((response["response"]["data"]["wan_bandwidth"] / 1000), 1)
+                # Back off while the server is idle and return to the normal cadence once streams start
+                interval = min_interval if stream_count else min(interval * 2, max_interval)
 
-                if display_streams:
-                    activity_text = f"{stream_count} streams at {wan_bandwidth_mbps} mbps"
-                    activity_type = nextcord.ActivityType.playing
-                else:
-                    activity_text = ": plex help"
-                    activity_type = nextcord.ActivityType.listening
-
-                await self.bot.change_presence(
-                    activity=nextcord.Activity(type=activity_type, name=activity_text)
-                )
-                display_streams = not display_streams  # Toggle the display mode
+                activity = next(presences)(stream_count, wan_bandwidth_mbps)
+                if (activity.type, activity.name) != last_sent:
+                    await self.bot.change_presence(activity=activity)
+                    last_sent = (activity.type, activity.name)
             except Exception as e:
                 logger.error(f"Error in status_task(): {e}")
 
-            await asyncio.sleep(15)  # Control how often to update the status
+            await asyncio.sleep(interval)  # Control how often to update the status
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -71,13 +78,16 @@ class ServerCommands(commands.Cog):
             r = await self.tautulli.get_home_stats()
             status = r["response"]["result"]
 
-            local_commit = get_git_revision_short_hash()
-            latest_commit = get_git_revision_short_hash_latest()
+            # Both may read the disk, and the latter runs a networked git fetch, so keep them off the loop
+            local_commit, latest_commit = await asyncio.gather(
+                asyncio.to_thread(get_git_revision_hash),
+                asyncio.to_thread(get_git_revision_hash_latest),
+            )
             up_to_date = ""
-            if local_commit and latest_commit:
-                up_to_date = (
-                    "Version outdated. Consider running git pull" if local_commit != latest_commit else ""
-                )
+            # Compare full hashes; git lengthens its short hashes as the repository grows
+            if "unknown" not in (local_commit, latest_commit) and local_commit != latest_commit:
+                up_to_date = "Version outdated. Consider running git pull"
+            local_commit, latest_commit = short_git_hash(local_commit), short_git_hash(latest_commit)
 
             if status == "success":
                 logger.info(f"Logged in as {self.bot.user}")
@@ -103,13 +113,13 @@ class ServerCommands(commands.Cog):
             server_info = server_info_response["response"]
 
             # Fetching Plex status from Plex API asynchronously
-            async with aiohttp.ClientSession() as session:
-                async with session.get("https://status.plex.tv/api/v2/status.json") as response:
-                    if response.status == 200:
-                        json_response = await response.json()
-                        plex_status = json_response["status"]["description"]
-                    else:
-                        plex_status = "Plex status unavailable"
+            session = HttpSession.get()
+            async with session.get("https://status.plex.tv/api/v2/status.json") as response:
+                if response.status == 200:
+                    json_response = orjson.loads(await response.read())
+                    plex_status = json_response["status"]["description"]
+                else:
+                    plex_status = "Plex status unavailable"
 
             # Setting up the embed message with server information and Plex status
             embed = nextcord.Embed(title="Plex Server Details", colour=self.plex_embed_color)
@@ -138,14 +148,14 @@ class ServerCommands(commands.Cog):
     @commands.command()
     async def killstream(self, ctx, session_key: str = None, *, message: str = None):
         """Terminates a Plex stream based on the session key."""
-        session_keys = []
         if session_key is None:
             activity = await self.tautulli.get_activity()
             sessions = activity["response"]["data"]["sessions"]
-            for users in sessions:
-                session_keys.append(f"\n**Session key:** {users['session_key']} is: **{users['user']}**,")
+            session_keys = "".join(
+                f"\n**Session key:** {users['session_key']} is: **{users['user']}**," for users in sessions
+            )
             await ctx.send(
-                f"You provided no session keys, current users are: {''.join(session_keys)}\nYou can use `plex killstream [session_key] '[message]'` to kill a stream above;"
+                f"You provided no session keys, current users are: {session_keys}\nYou can use `plex killstream [session_key] '[message]'` to kill a stream above;"
                 "\nMessage will be passed to the user in a pop-up window on their Plex client.\n ⚠️ It is recommended to use 'apostrophes' around the message to avoid errors."
             )
             return
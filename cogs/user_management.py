@@ -25,24 +25,23 @@ class UserManagement(commands.Cog):
 
         discord_user = discord_user or ctx.author
         mappings = UserMappings.load_user_mappings()
+        member = UserMappings.get_mapping_by_discord_id(str(discord_user.id))
 
-        for member in mappings:
-            if str(member.get("discord_id")) == str(discord_user.id):
-                if member.get("plex_username") == plex_username:
-                    await ctx.send(f"You are already mapped to {plex_username}.")
-                    return
-                else:
-                    member["plex_username"] = plex_username
-                    UserMappings.save_user_mappings(mappings)
-                    await ctx.send(
-                        f"Successfully updated mapping for {discord_user.display_name} to {plex_username}."
-                    )
-                    logger.info(f"Updated mapping for {discord_user.display_name} to {plex_username}.")
-                    return
+        if member is not None:
+            if member.get("plex_username") == plex_username:
+                await ctx.send(f"You are already mapped to {plex_username}.")
+                return
+            member["plex_username"] = plex_username
+            await UserMappings.save_user_mappings_async(mappings)
+            await ctx.send(
+                f"Successfully updated mapping for {discord_user.display_name} to {plex_username}."
+            )
+            logger.info(f"Updated mapping for {discord_user.display_name} to {plex_username}.")
+            return
 
         # If user is not found, add them
         mappings.append({"discord_id": discord_user.id, "plex_username": plex_username})
-        UserMappings.save_user_mappings(mappings)
+        await UserMappings.save_user_mappings_async(mappings)
         await ctx.send(f"Successfully mapped {discord_user.display_name} to {plex_username}.")
         logger.info(f"Mapped {discord_user.display_name} to {plex_username}.")
 
@@ -54,23 +53,19 @@ class UserManagement(commands.Cog):
             return
 
         mappings = UserMappings.load_user_mappings()
-        found = False
-
-        for member in mappings:
-            if member.get("plex_username") == plex_username:
-                member["ignore"] = not member.get("ignore", False)
-                found = True
-                status = "no longer" if not member["ignore"] else "now"
-                await ctx.send(f"{plex_username} is {status} ignored in top lists.")
-                logger.info(f"{plex_username} is {status} ignored in top lists.")
-                break
-
-        if not found:
+        member = UserMappings.get_mapping_by_plex_username(plex_username)
+
+        if member is not None:
+            member["ignore"] = not member.get("ignore", False)
+            status = "no longer" if not member["ignore"] else "now"
+            await ctx.send(f"{plex_username} is {status} ignored in top lists.")
+            logger.info(f"{plex_username} is {status} ignored in top lists.")
+        else:
             mappings.append({"discord_id": "", "plex_username": plex_username, "ignore": True})
             await ctx.send(f"{plex_username} is now ignored in top lists.")
             logger.info(f"{plex_username} is now ignored in top lists.")
 
-        UserMappings.save_user_mappings(mappings)
+        await UserMappings.save_user_mappings_async(mappings)
 
 
 def setup(bot):
@@ -6,7 +6,9 @@ Entry point for the PlexBot Discord bot.
 Initializes the bot, loads configurations, sets up logging, and starts the bot.
 """
 
+import asyncio
 import logging
+import signal
 import sys
 import traceback
 from pathlib import Path
@@ -14,7 +16,7 @@ from pathlib import Path
 import nextcord
 from nextcord.ext import commands
 
-from utilities import Config
+from utilities import Config, HttpSession, prune_image_cache
 from tautulli_wrapper import Tautulli, TMDB
 
 # Configure logging
@@ -25,6 +27,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger("plexbot")
 
+# Use uvloop's libuv-backed event loop where available (not supported on Windows)
+try:
+    import uvloop
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("Using uvloop event loop.")
+except ImportError:
+    logger.info("uvloop not available; using the default asyncio event loop.")
+
+
+async def start_bot(bot, token, tautulli, tmdb):
+    """Open the shared API sessions and run the bot until it disconnects."""
+    await tautulli.initialize()
+    if tmdb:
+        await tmdb.initialize()
+    await asyncio.to_thread(prune_image_cache)
+    # Connect to Tautulli while logging in to Discord, so the first command reuses an open
+    # connection; the response also primes the server info cache
+    warmup = asyncio.create_task(tautulli.get_server_info())
+    try:
+        await bot.start(token)
+    finally:
+        warmup.cancel()
+
+
+async def shutdown(bot, tautulli, tmdb):
+    """Close the bot connection and the shared API sessions."""
+    if not bot.is_closed():
+        await bot.close()
+    await tautulli.close()
+    if tmdb:
+        await tmdb.close()
+    await HttpSession.close()
+
+
+def cancel_pending_tasks(loop):
+    """Cancel and wait for any tasks still running, such as the cogs' background loops."""
+    tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.run_until_complete(loop.shutdown_asyncgens())
+
 
 def main():
     logger.info("Starting PlexBot...")
@@ -42,6 +87,13 @@ def main():
         logger.error(f"Missing required configuration keys: {', '.join(missing_keys)}")
         return
 
+    # Create the event loop up front so the bot and every cog share it
+    loop = asyncio.new_event_loop()
+    if hasattr(asyncio, "eager_task_factory"):
+        # Python 3.12+: run new tasks eagerly until their first suspension point
+        loop.set_task_factory(asyncio.eager_task_factory)
+    asyncio.set_event_loop(loop)
+
     # Create the bot and configure intents
     intents = nextcord.Intents.default()
     intents.message_content = True
@@ -97,12 +149,23 @@ def main():
             logger.exception(f"Failed to load cog {cog_name}.")
 
     # Run the bot
+    main_task = loop.create_task(start_bot(bot, config["token"], tautulli, tmdb))
+    # Cancel the bot on SIGINT/SIGTERM (e.g. from systemd or pm2) so the shutdown below still runs
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, main_task.cancel)
+        except NotImplementedError:
+            pass  # Signal handlers aren't supported by Windows event loops
     try:
-        bot.run(config["token"])
-    except KeyboardInterrupt:
-        logger.info("Bot shutdown requested by user.")
+        loop.run_until_complete(main_task)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info("Bot shutdown requested.")
     except Exception as e:
         logger.exception("Failed to run the bot.")
+    finally:
+        loop.run_until_complete(shutdown(bot, tautulli, tmdb))
+        cancel_pending_tasks(loop)
+        loop.close()
 
 
 if __name__ == "__main__":
@@ -3,7 +3,11 @@
 import aiohttp
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+import time
+from urllib.parse import urlencode
+from typing import Optional, Dict, Any, List, Tuple
+
+import orjson
 
 # Configure logging for this module
 logger = logging.getLogger("plexbot.tautulli_wrapper")
@@ -11,34 +15,142 @@ logger.setLevel(logging.INFO)
 
 
 class Tautulli:
+    # Seconds a successful response is reused for read-only commands
+    CACHE_TTLS = {
+        "get_activity": 10,
+        "get_home_stats": 60,
+        "get_history": 60,
+        "get_libraries": 300,
+        "get_libraries_table": 60,
+        "get_library": 300,
+        "get_collections_table": 300,
+        "get_server_info": 3600,
+    }
+    # Most distinct queries kept at once; the oldest is dropped first
+    CACHE_SIZE = 256
+
     def __init__(self, api_key: str, tautulli_ip: str) -> None:
         logger.info("Initializing Tautulli wrapper.")
         self.api_key = api_key
         self.tautulli_ip = tautulli_ip
         self.tautulli_api_url = f"http://{self.tautulli_ip}/api/v2"
+        self.default_params = {"apikey": self.api_key}
         self.session: Optional[aiohttp.ClientSession] = None
+        self._closed = False
+        self._cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+        self._cache_locks: Dict[Tuple, asyncio.Lock] = {}
+        self._cache_lock_users: Dict[Tuple, int] = {}
         logger.info(f"Tautulli API URL set to {self.tautulli_api_url}")
 
     async def initialize(self) -> None:
         """Asynchronous initializer to set up aiohttp ClientSession."""
+        self._closed = False
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            # Keep connections to the single Tautulli host alive between calls
+            connector = aiohttp.TCPConnector(
+                limit=32,
+                limit_per_host=16,
+                keepalive_timeout=75,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=30, connect=10)
+            )
             logger.info("aiohttp ClientSession initialized for Tautulli.")
 
     async def close(self) -> None:
         """Close the aiohttp ClientSession."""
+        self._closed = True
         if self.session and not self.session.closed:
             await self.session.close()
             logger.info("aiohttp ClientSession closed for Tautulli.")
 
+    async def __aenter__(self) -> "Tautulli":
+        await self.initialize()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
     async def api_call(self, cmd: str, params: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         if params is None:
             params = {}
-        params["apikey"] = self.api_key
-        params["cmd"] = cmd
+        ttl = self.CACHE_TTLS.get(cmd)
+        if ttl is None:
+            return await self._request(cmd, params)
+
+        # One lock per query so concurrent callers share a single request
+        key = (cmd, tuple(sorted(params.items())))
+        lock = self._cache_locks.setdefault(key, asyncio.Lock())
+        self._cache_lock_users[key] = self._cache_lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                cached = self._cache.get(key)
+                if cached and time.monotonic() - cached[0] < ttl:
+                    return cached[1]
+                response = await self._request(cmd, params)
+                if response and response.get("response", {}).get("result") == "success":
+                    self._store(key, response)
+                return response
+        finally:
+            # Drop the lock once no caller holds or waits on it, so keys that are never cached
+            # don't pile up; release() alone would leave queued waiters on a lock no longer shared
+            if self._cache_locks.get(key) is lock:
+                users = self._cache_lock_users[key] - 1
+                if users:
+                    self._cache_lock_users[key] = users
+                else:
+                    del self._cache_locks[key]
+                    del self._cache_lock_users[key]
+
+    def _store(self, key: Tuple, response: Dict[str, Any]) -> None:
+        """Cache a response, purging expired entries and the oldest one if the cache is full."""
+        now = time.monotonic()
+        # Expired responses (e.g. large history pages) would otherwise linger until evicted
+        expired = [
+            k for k, (stored_at, _) in self._cache.items() if now - stored_at >= self.CACHE_TTLS[k[0]]
+        ]
+        for expired_key in expired:
+            del self._cache[expired_key]
+        self._cache.pop(key, None)
+        if len(self._cache) >= self.CACHE_SIZE:
+            del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now, response)
+
+    def clear_cache(self) -> None:
+        """Drop all cached responses so the next calls go to Tautulli."""
+        self._cache.clear()
+        self._cache_locks.clear()
+        self._cache_lock_users.clear()
+        logger.info("Tautulli response cache cleared.")
+
+    async def fetch_many(
+        self, calls: List[Tuple[str, Dict[str, Any]]], concurrency: int = 16
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Run several API calls concurrently and return their responses in order."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(cmd: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await self.api_call(cmd, params)
+
+        return await asyncio.gather(*(call(cmd, params) for cmd, params in calls))
+
+    async def _request(self, cmd: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Send a single request to the Tautulli API."""
+        # Build a fresh dict so the caller's params (and the cache key) are left untouched
+        params = {**self.default_params, "cmd": cmd, **params}
+        # Open the session lazily on first use, but never again once close() has run,
+        # otherwise a late caller would leak a session nobody closes
+        if self._closed:
+            logger.warning(f"API call '{cmd}' skipped, the Tautulli session is shut down.")
+            return None
+        if self.session is None or self.session.closed:
+            await self.initialize()
         try:
-            async with self.session.get(self.tautulli_api_url, params=params, timeout=30) as response:
-                response_json = await response.json()
+            async with self.session.get(self.tautulli_api_url, params=params) as response:
+                response_json = orjson.loads(await response.read())
                 return response_json
         except asyncio.TimeoutError:
             logger.error(f"API call '{cmd}' timed out.")
@@ -63,7 +175,7 @@ class Tautulli:
         if count is None:
             error_msg = "count is required; see Tautulli API Reference."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         params = {"count": count}
         return await self.api_call("get_recently_added", params)
 
@@ -72,7 +184,7 @@ class Tautulli:
         if section_id is None:
             error_msg = "section_id is required; see Tautulli API Reference."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         params = {"section_id": section_id}
         return await self.api_call("get_collections_table", params)
 
@@ -83,7 +195,7 @@ class Tautulli:
         if rating_key is None:
             error_msg = "rating_key is required; see Tautulli API Reference."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         if params is None:
             params = {}
         params["rating_key"] = rating_key
@@ -96,7 +208,7 @@ class Tautulli:
         if rating_key is None:
             error_msg = "rating_key is required; see Tautulli API Reference."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         if params is None:
             params = {}
         params["rating_key"] = rating_key
@@ -107,7 +219,7 @@ class Tautulli:
         if rating_key is None:
             error_msg = "rating_key is required; see Tautulli API Reference."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         params = {"rating_key": rating_key}
         return await self.api_call("get_metadata", params)
 
@@ -122,12 +234,14 @@ class Tautulli:
         if session_id is None and session_key is None:
             error_msg = "Either session_key or session_id is required."
             logger.error(error_msg)
-            return 400
-        params = {"message": message}
+            raise ValueError(error_msg)
         if session_key is not None:
-            params["session_key"] = session_key
+            params = {"session_key": session_key}
         else:
-            params["session_id"] = session_id
+            params = {"session_id": session_id}
+        # aiohttp rejects None query values, so only send a message when there is one
+        if message:
+            params["message"] = str(message)
         response = await self.api_call("terminate_session", params)
         if response and response.get("response", {}).get("result") == "success":
             return 200
@@ -139,7 +253,7 @@ class Tautulli:
         if section_id is None:
             error_msg = "Section ID is required."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         params = {"section_id": section_id}
         return await self.api_call("get_library_user_stats", params)
 
@@ -156,34 +270,81 @@ class Tautulli:
         if section_id is None:
             error_msg = "section_id is required."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         params = {"section_id": section_id}
         return await self.api_call("get_library", params)
 
-    async def get_library_media_info(
-        self,
+    @staticmethod
+    def _library_media_info_params(
         section_id=None,
         rating_key=None,
         media_info=0,
         length=50,
         include_metadata=0,
-    ) -> Optional[Dict[str, Any]]:
-        """Get media information for a library or specific item."""
+        start=0,
+    ) -> Dict[str, Any]:
+        """Build the query for one page of get_library_media_info."""
         if section_id is None and rating_key is None:
             error_msg = "Either section_id or rating_key are required."
             logger.error(error_msg)
-            return {"response": {"result": "error", "message": error_msg}}
+            raise ValueError(error_msg)
         params = {
             "media_info": media_info,
             "include_metadata": include_metadata,
             "length": length,
+            "start": start,
         }
         if section_id is not None:
             params["section_id"] = section_id
         else:
             params["rating_key"] = rating_key
+        return params
+
+    async def get_library_media_info(
+        self,
+        section_id=None,
+        rating_key=None,
+        media_info=0,
+        length=50,
+        include_metadata=0,
+        start=0,
+    ) -> Optional[Dict[str, Any]]:
+        """Get media information for a library or specific item."""
+        params = self._library_media_info_params(
+            section_id, rating_key, media_info, length, include_metadata, start
+        )
         return await self.api_call("get_library_media_info", params)
 
+    async def get_all_library_media_items(
+        self, section_id: str, page_size: int = 500
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Get every media item in a library, fetching the pages after the first concurrently."""
+        response = await self.get_library_media_info(section_id=section_id, length=page_size)
+        if not response or response.get("response", {}).get("result") != "success":
+            return None
+        data = response["response"]["data"]
+        items = list(data.get("data", []))
+        # The first page tells us how many items there are in total
+        total = int(data.get("recordsFiltered") or 0)
+        if total > len(items):
+            pages = await self.fetch_many(
+                [
+                    (
+                        "get_library_media_info",
+                        self._library_media_info_params(
+                            section_id=section_id, length=page_size, start=start
+                        ),
+                    )
+                    for start in range(page_size, total, page_size)
+                ]
+            )
+            for page in pages:
+                if not page or page.get("response", {}).get("result") != "success":
+                    logger.error(f"Failed to fetch a page of media info for library {section_id}")
+                    return None
+                items.extend(page["response"]["data"].get("data", []))
+        return items
+
     async def get_most_watched_movies(self, time_range: int) -> Optional[Dict[str, Any]]:
         """Retrieve details about the most watched movies."""
         params = {
@@ -200,23 +361,39 @@ class Tautulli:
         }
         return await self.api_call("get_home_stats", params)
 
-    def pms_image_proxy(self, img: str) -> str:
+    def pms_image_proxy(self, img: str, width: int = 300, height: int = 450) -> str:
         """Construct the PMS image proxy URL."""
-        return f"http://{self.tautulli_ip}/pms_image_proxy?img={img}&width=300&height=450&fallback=poster"
+        query = urlencode({"img": img, "width": width, "height": height, "fallback": "poster"})
+        return f"http://{self.tautulli_ip}/pms_image_proxy?{query}"
 
 
 class TMDB:
+    # TMDB's genre list rarely changes, so refresh it once a day
+    GENRE_CACHE_TTL = 86400
+    # Movie details are effectively static, so reuse them for a day as well
+    MOVIE_DETAILS_CACHE_TTL = 86400
+
     def __init__(self, api_key: str) -> None:
         logger.info("Initializing TMDB wrapper.")
         self.api_key = api_key
         self.tmdb_api_url = "https://api.themoviedb.org/3/"
         self.session: Optional[aiohttp.ClientSession] = None
+        self._genre_ids: Optional[Dict[str, int]] = None
+        self._genres_fetched_at = 0.0
+        self._genre_lock = asyncio.Lock()
+        self._movie_details: Dict[int, Tuple[float, dict]] = {}
         logger.info("TMDB API URL set.")
 
     async def initialize(self) -> None:
         """Asynchronous initializer to set up aiohttp ClientSession."""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            # api.themoviedb.org needs a DNS lookup, so keep it cached well past aiohttp's 10s default
+            connector = aiohttp.TCPConnector(
+                limit=16, keepalive_timeout=75, ttl_dns_cache=300, enable_cleanup_closed=True
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=30, connect=10)
+            )
             logger.info("aiohttp ClientSession initialized for TMDB.")
 
     async def close(self) -> None:
@@ -245,7 +422,7 @@ class TMDB:
         async def fetch_results(url: str, media_type: str):
             async with self.session.get(url, params=params) as response:
                 if response.status == 200:
-                    results = (await response.json()).get("results", [])
+                    results = (orjson.loads(await response.read())).get("results", [])
                     for result in results:
                         result["media_type"] = media_type
                     return results
@@ -253,9 +430,19 @@ class TMDB:
                     logger.error(f"Failed to get {media_type} search results: {response.status}")
                     return []
 
-        movie_results = await fetch_results(movie_url, "movie")
-        tv_results = await fetch_results(tv_url, "tv_show")
-        combined_results.extend(movie_results + tv_results)
+        # The movie and TV searches are independent, so run them concurrently
+        for media_type, results in zip(
+            ("movie", "tv_show"),
+            await asyncio.gather(
+                fetch_results(movie_url, "movie"),
+                fetch_results(tv_url, "tv_show"),
+                return_exceptions=True,
+            ),
+        ):
+            if isinstance(results, Exception):
+                logger.error(f"Failed to get {media_type} search results: {results}")
+                continue
+            combined_results.extend(results)
 
         # Sort results by popularity
         combined_results.sort(key=lambda x: x.get("popularity", 0), reverse=True)
@@ -265,12 +452,16 @@ class TMDB:
         if movie_id is None:
             error_msg = "movie_id is required; see TMDB API Reference."
             logger.error(error_msg)
-            return None
+            raise ValueError(error_msg)
+        cached = self._movie_details.get(movie_id)
+        if cached and time.monotonic() - cached[0] < self.MOVIE_DETAILS_CACHE_TTL:
+            return cached[1]
         url = self.tmdb_api_url + f"movie/{movie_id}"
         params = {"api_key": self.api_key}
         async with self.session.get(url=url, params=params) as response:
             if response.status == 200:
-                response_json = await response.json()
+                response_json = orjson.loads(await response.read())
+                self._movie_details[movie_id] = (time.monotonic(), response_json)
                 return response_json
             else:
                 logger.error(f"Failed to get movie details: {response.status}")
@@ -278,23 +469,26 @@ class TMDB:
 
     async def get_genre_id(self, genre_name: str) -> Optional[int]:
         """Get the TMDB genre ID for a given genre name."""
-        url = self.tmdb_api_url + "genre/movie/list"
-        params = {"api_key": self.api_key, "language": "en-US"}
-        async with self.session.get(url=url, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-                genres = data.get("genres", [])
-                for genre in genres:
-                    if genre["name"].lower() == genre_name.lower():
-                        return genre["id"]
-            else:
-                logger.error(f"Failed to get genre list: {response.status}")
-        return None
+        async with self._genre_lock:
+            if self._genre_ids is None or time.monotonic() - self._genres_fetched_at > self.GENRE_CACHE_TTL:
+                url = self.tmdb_api_url + "genre/movie/list"
+                params = {"api_key": self.api_key, "language": "en-US"}
+                async with self.session.get(url=url, params=params) as response:
+                    if response.status == 200:
+                        data = orjson.loads(await response.read())
+                        self._genre_ids = {
+                            genre["name"].lower(): genre["id"] for genre in data.get("genres", [])
+                        }
+                        self._genres_fetched_at = time.monotonic()
+                    else:
+                        logger.error(f"Failed to get genre list: {response.status}")
+                        return None
+        return self._genre_ids.get(genre_name.lower())
 
     async def get_popular_items(self, genre_id: int) -> Optional[list]:
         """Get popular movies or shows for a given genre ID."""
-        recommendations = []
-        for media_type in ["movie", "tv"]:
+
+        async def fetch_popular(media_type: str) -> list:
             url = self.tmdb_api_url + f"discover/{media_type}"
             params = {
                 "api_key": self.api_key,
@@ -305,10 +499,22 @@ class TMDB:
             }
             async with self.session.get(url=url, params=params) as response:
                 if response.status == 200:
-                    data = await response.json()
-                    for item in data.get("results", []):
+                    data = orjson.loads(await response.read())
+                    results = data.get("results", [])
+                    for item in results:
                         item["media_type"] = media_type
-                        recommendations.append(item)
-                else:
-                    logger.error(f"Failed to get popular items for {media_type}: {response.status}")
+                    return results
+                logger.error(f"Failed to get popular items for {media_type}: {response.status}")
+                return []
+
+        media_types = ["movie", "tv"]
+        recommendations = []
+        for media_type, results in zip(
+            media_types,
+            await asyncio.gather(*(fetch_popular(t) for t in media_types), return_exceptions=True),
+        ):
+            if isinstance(results, Exception):
+                logger.error(f"Failed to get popular items for {media_type}: {results}")
+                continue
+            recommendations.extend(results)
         return recommendations
@@ -1,15 +1,21 @@
 # utilities.py
 
 import asyncio
+import hashlib
 import json
 import logging
+import os
 import subprocess
-from functools import lru_cache
+import tempfile
+import threading
+import time
 from io import BytesIO
-from typing import List, Dict, Any
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 import aiohttp
 import nextcord
+import orjson
 from nextcord.ext import menus
 from nextcord import File
 
@@ -19,18 +25,33 @@ logger.setLevel(logging.INFO)
 
 class Config:
     _config_data = None
+    _config_file_key = None  # (mtime, size) of the config file when it was last read or written
+    _write_lock = threading.Lock()
+
+    @staticmethod
+    def _stat_config_file(filename: str):
+        """Return the (mtime, size) of the config file, or None if it doesn't exist."""
+        try:
+            st = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
 
     @classmethod
     def load_config(cls, filename: str = "config.json") -> Dict[str, Any]:
-        """Load the configuration data from a JSON file."""
-        if cls._config_data is None:
+        """Load the configuration data from a JSON file, re-reading it only when it changes on disk."""
+        file_key = cls._stat_config_file(filename)
+        if cls._config_data is None or file_key != cls._config_file_key:
             try:
-                with open(filename, "r", encoding="utf-8") as f:
-                    cls._config_data = json.load(f)
+                with open(filename, "rb") as f:
+                    cls._config_data = orjson.loads(f.read())
+                cls._config_file_key = file_key
                 logger.info("Configuration loaded successfully.")
             except Exception as e:
                 logger.exception("Failed to load configuration.")
-                cls._config_data = {}
+                # Keep the last good config (the file may be mid-write) and retry on the next call
+                if cls._config_data is None:
+                    cls._config_data = {}
         return cls._config_data
 
     @classmethod
@@ -41,107 +62,362 @@ class Config:
 
     @classmethod
     def save_config(cls, data: Dict[str, Any], filename: str = "config.json") -> None:
-        """Save the configuration data to a JSON file."""
+        """Save the configuration data to a JSON file, replacing it atomically."""
         try:
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4)
-            cls._config_data = data
+            with cls._write_lock:
+                tmp_file = f"{filename}.tmp"
+                # Keep the 4-space indent people use when editing config.json by hand;
+                # orjson only indents by 2, and the config is rarely written
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=4)
+                os.replace(tmp_file, filename)
+                cls._config_data = data
+                cls._config_file_key = cls._stat_config_file(filename)
             logger.info("Configuration saved successfully.")
         except Exception as e:
             logger.exception("Failed to save configuration.")
 
+    @classmethod
+    async def save_config_async(cls, data: Dict[str, Any], filename: str = "config.json") -> None:
+        """Save the configuration data to a JSON file without blocking the event loop."""
+        await asyncio.to_thread(cls.save_config, data, filename)
+
     @classmethod
     def reload_config(cls, filename: str = "config.json") -> Dict[str, Any]:
         """Reload the configuration data from the JSON file."""
-        cls._config_data = None
+        # Forget the file key rather than the data, so a failed re-read keeps the last good config
+        cls._config_file_key = ()
         return cls.load_config(filename)
 
 
+class HttpSession:
+    _session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def get(cls) -> aiohttp.ClientSession:
+        """Get the shared aiohttp session for one-off requests, creating it if needed."""
+        if cls._session is None or cls._session.closed:
+            # Cap per-host connections so thumbnail fan-out doesn't flood the Tautulli image proxy
+            connector = aiohttp.TCPConnector(
+                limit=32,
+                limit_per_host=8,
+                keepalive_timeout=75,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True,
+            )
+            cls._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=30, connect=10)
+            )
+            logger.info("Shared aiohttp ClientSession initialized.")
+        return cls._session
+
+    @classmethod
+    async def close(cls) -> None:
+        """Close the shared aiohttp session."""
+        if cls._session and not cls._session.closed:
+            await cls._session.close()
+            logger.info("Shared aiohttp ClientSession closed.")
+
+
 class UserMappings:
     _mappings = None
     _mapping_file = "map.json"
+    _mapping_file_key = None  # (mtime, size) of map.json when it was last read or written
+    _write_lock = threading.Lock()
+    _by_discord_id: Dict[str, Dict[str, Any]] = {}
+    _by_plex_username: Dict[str, Dict[str, Any]] = {}
+    _ignored_usernames: Set[str] = set()
+
+    @classmethod
+    def _stat_mapping_file(cls):
+        """Return the (mtime, size) of the mapping file, or None if it doesn't exist."""
+        try:
+            st = os.stat(cls._mapping_file)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
 
     @classmethod
-    @lru_cache(maxsize=1)
     def load_user_mappings(cls) -> List[Dict[str, Any]]:
-        """Load user mappings from the JSON file."""
-        if cls._mappings is None:
-            try:
-                with open(cls._mapping_file, "r", encoding="utf-8") as json_file:
-                    cls._mappings = json.load(json_file)
-                logger.info("User mappings loaded successfully.")
-            except (json.JSONDecodeError, FileNotFoundError) as err:
-                logger.error(f"Failed to load or decode JSON: {err}")
-                cls._mappings = []
+        """Load user mappings from the JSON file, re-reading it only when it changes on disk."""
+        file_key = cls._stat_mapping_file()
+        if cls._mappings is None or file_key != cls._mapping_file_key:
+            mappings = None
+            if file_key is None or file_key[1] == 0:
+                # A missing or empty map.json just means nobody has been mapped yet, unless it was
+                # readable before, in which case it's most likely being rewritten right now
+                if cls._mappings is None:
+                    mappings = []
+            else:
+                try:
+                    with open(cls._mapping_file, "rb") as json_file:
+                        mappings = orjson.loads(json_file.read()) or []
+                    logger.info("User mappings loaded successfully.")
+                except (orjson.JSONDecodeError, FileNotFoundError) as err:
+                    logger.error(f"Failed to load or decode JSON: {err}")
+                    if cls._mappings is None:
+                        # Start empty, but leave the key unset so the next call reads the file again
+                        cls._mappings = []
+                        cls._build_indexes()
+            # On a failed re-read, keep the previous mappings and key so the next call retries
+            if mappings is not None:
+                cls._mappings = mappings
+                cls._mapping_file_key = file_key
+                cls._build_indexes()
         return cls._mappings
 
+    @classmethod
+    def _build_indexes(cls) -> None:
+        """Index the loaded mappings by Discord ID and Plex username, keeping the first match."""
+        by_discord_id = {}
+        by_plex_username = {}
+        ignored_usernames = set()
+        for mapping in cls._mappings:
+            if mapping.get("discord_id"):
+                by_discord_id.setdefault(str(mapping["discord_id"]), mapping)
+            if mapping.get("plex_username"):
+                by_plex_username.setdefault(mapping["plex_username"], mapping)
+                if mapping.get("ignore", False):
+                    ignored_usernames.add(mapping["plex_username"])
+        cls._by_discord_id = by_discord_id
+        cls._by_plex_username = by_plex_username
+        cls._ignored_usernames = ignored_usernames
+
     @classmethod
     def save_user_mappings(cls, data: List[Dict[str, Any]]) -> None:
-        """Save user mappings to the JSON file."""
+        """Save user mappings to the JSON file, replacing it atomically."""
         try:
-            with open(cls._mapping_file, "w", encoding="utf-8") as json_file:
-                json.dump(data, json_file, indent=4)
-            cls._mappings = data
-            cls.load_user_mappings.cache_clear()  # Invalidate the cache
-            logger.info("User mappings saved and cache cleared.")
+            with cls._write_lock:
+                tmp_file = f"{cls._mapping_file}.tmp"
+                with open(tmp_file, "wb") as json_file:
+                    json_file.write(orjson.dumps(data))
+                    # Make sure the new contents are on disk before they replace the old file
+                    json_file.flush()
+                    os.fsync(json_file.fileno())
+                os.replace(tmp_file, cls._mapping_file)
+                cls._mappings = data
+                cls._mapping_file_key = cls._stat_mapping_file()
+                cls._build_indexes()
+            logger.info("User mappings saved.")
         except Exception as e:
             logger.exception(f"Failed to save user mappings: {e}")
 
+    @classmethod
+    async def save_user_mappings_async(cls, data: List[Dict[str, Any]]) -> None:
+        """Save user mappings to the JSON file without blocking the event loop."""
+        await asyncio.to_thread(cls.save_user_mappings, data)
+
     @classmethod
     def get_mapping_by_discord_id(cls, discord_id: str) -> Dict[str, Any]:
         """Get the mapping for a given Discord ID."""
-        mappings = cls.load_user_mappings()
-        return next((m for m in mappings if str(m.get("discord_id")) == discord_id), None)
+        cls.load_user_mappings()
+        return cls._by_discord_id.get(discord_id)
 
     @classmethod
     def get_mapping_by_plex_username(cls, plex_username: str) -> Dict[str, Any]:
         """Get the mapping for a given Plex username."""
-        mappings = cls.load_user_mappings()
-        return next((m for m in mappings if m.get("plex_username") == plex_username), None)
+        cls.load_user_mappings()
+        return cls._by_plex_username.get(plex_username)
+
+    @classmethod
+    def get_ignored_usernames(cls) -> Set[str]:
+        """Get the Plex usernames that are ignored in top lists."""
+        cls.load_user_mappings()
+        return cls._ignored_usernames
+
+
+# (seconds per unit, singular, plural) for days_hours_minutes
+_DURATION_UNITS = ((86400, "day", "days"), (3600, "hour", "hours"), (60, "minute", "minutes"))
 
 
 def days_hours_minutes(seconds: int) -> str:
     """Converts seconds to days, hours, minutes."""
-    if not isinstance(seconds, int):
-        raise TypeError("Seconds must be an integer.")
-
     if seconds < 0:
         raise ValueError("Seconds must be non-negative.")
 
-    days, seconds = divmod(seconds, 86400)
-    hours, seconds = divmod(seconds, 3600)
-    minutes, _ = divmod(seconds, 60)
-
     parts = []
-    if days > 0:
-        parts.append(f"{days} {'day' if days == 1 else 'days'}")
-    if hours > 0:
-        parts.append(f"{hours} {'hour' if hours == 1 else 'hours'}")
-    if minutes > 0:
-        parts.append(f"{minutes} {'minute' if minutes == 1 else 'minutes'}")
+    for unit_seconds, singular, plural in _DURATION_UNITS:
+        value, seconds = divmod(seconds, unit_seconds)
+        if value:
+            parts.append(f"{value} {singular if value == 1 else plural}")
 
     return ", ".join(parts) if parts else "0 minutes"
 
 
-def get_git_revision_short_hash() -> str:
-    """Get the current git commit short hash."""
+def _read_git_head(git_dir: Path = Path(".git")) -> Optional[str]:
+    """Resolve HEAD to a commit hash by reading git's files, without running git."""
     try:
-        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).decode("ascii").strip()
-    except Exception as e:
-        logger.error(f"Failed to get git revision: {e}")
-        return "unknown"
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            return head  # Detached HEAD holds the hash itself
+        ref = head[len("ref: ") :]
+        ref_file = git_dir / ref
+        if ref_file.is_file():
+            return ref_file.read_text().strip()
+        # Refs that git has packed live in a single file instead
+        for line in (git_dir / "packed-refs").read_text().splitlines():
+            if line.endswith(f" {ref}"):
+                return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    return None
+
+
+# The checkout only changes on a redeploy, which restarts the bot, so a found hash is kept
+_local_revision: Optional[str] = None
+
+
+def get_git_revision_hash() -> str:
+    """Get the current git commit hash."""
+    global _local_revision
+    if _local_revision is not None:
+        return _local_revision
+    commit = _read_git_head()
+    if not commit:
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except Exception as e:
+            logger.error(f"Failed to get git revision: {e}")
+            return "unknown"
+    _local_revision = commit
+    return commit
+
+
+def short_git_hash(commit: str) -> str:
+    """Shorten a commit hash for display."""
+    return commit if commit == "unknown" else commit[:7]
 
 
-def get_git_revision_short_hash_latest() -> str:
-    """Get the latest git commit short hash from origin."""
+# Seconds to reuse the result of the last git fetch
+LATEST_REVISION_TTL = 300
+_latest_revision = (0.0, None)
+
+
+def get_git_revision_hash_latest() -> str:
+    """Get the latest git commit hash from origin."""
+    global _latest_revision
+    fetched_at, revision = _latest_revision
+    if revision is not None and time.monotonic() - fetched_at < LATEST_REVISION_TTL:
+        return revision
     try:
-        subprocess.check_call(["git", "fetch"])
-        return (
-            subprocess.check_output(["git", "rev-parse", "--short", "origin/HEAD"]).decode("ascii").strip()
-        )
+        subprocess.run(["git", "fetch"], check=True)
+        revision = subprocess.run(
+            ["git", "rev-parse", "origin/HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
     except Exception as e:
         logger.error(f"Failed to get latest git revision: {e}")
         return "unknown"
+    _latest_revision = (time.monotonic(), revision)
+    return revision
+
+
+# Recently fetched images by URL, so paging back and forth doesn't download them again
+IMAGE_CACHE_TTL = 300
+IMAGE_CACHE_SIZE = 128
+_image_cache: Dict[Tuple, Tuple[float, bytes]] = {}
+
+# Images also persist on disk, so they survive restarts. Entries expire IMAGE_DISK_CACHE_TTL after
+# they were written, and the oldest are dropped whenever the directory grows past the size limit
+IMAGE_CACHE_DIR = Path("cache/images")
+IMAGE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+IMAGE_DISK_CACHE_TTL = 6 * 60 * 60
+_image_disk_lock = threading.Lock()
+_image_disk_bytes: Optional[int] = None
+
+
+def _image_cache_path(key: Tuple) -> Path:
+    """Return the on-disk cache path for an image key."""
+    return IMAGE_CACHE_DIR / f"{hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()}.jpg"
+
+
+def _read_cached_image(path: Path) -> Optional[bytes]:
+    """Read an image from the disk cache, returning None if it is missing or expired."""
+    try:
+        # Reads leave the mtime alone, so it stays the time the image was written
+        if time.time() - path.stat().st_mtime >= IMAGE_DISK_CACHE_TTL:
+            return None
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _write_cached_image(path: Path, data: bytes) -> None:
+    """Write an image to the disk cache atomically, pruning the cache if it grew too large."""
+    global _image_disk_bytes
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_file, path)
+    except OSError as e:
+        logger.error(f"Failed to cache image to disk: {e}")
+        return
+    with _image_disk_lock:
+        # Replaced files are counted twice, so the running total only errs towards pruning early
+        if _image_disk_bytes is not None:
+            _image_disk_bytes += len(data)
+        over_limit = _image_disk_bytes is None or _image_disk_bytes > IMAGE_CACHE_MAX_BYTES
+    if over_limit:
+        prune_image_cache()
+
+
+def prune_image_cache(max_bytes: int = IMAGE_CACHE_MAX_BYTES) -> None:
+    """Delete expired images, then the oldest ones, until the cache is well under max_bytes."""
+    global _image_disk_bytes
+    with _image_disk_lock:
+        files = []
+        if IMAGE_CACHE_DIR.is_dir():
+            for path in IMAGE_CACHE_DIR.iterdir():
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        # Prune to 90% of the limit so a full cache isn't rescanned on every write
+        target = max_bytes * 9 // 10
+        expired_before = time.time() - IMAGE_DISK_CACHE_TTL
+        removed = 0
+        for mtime, size, path in sorted(files):
+            if total <= target and mtime > expired_before:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        _image_disk_bytes = total
+    if removed:
+        logger.info(f"Pruned {removed} images from the image cache.")
+
+
+def _remember_image(key: Tuple, data: bytes) -> None:
+    """Keep an image in the in-memory cache, dropping the oldest entry when full."""
+    _image_cache.pop(key, None)
+    if len(_image_cache) >= IMAGE_CACHE_SIZE:
+        # Dicts keep insertion order, so the first key is the oldest entry
+        del _image_cache[next(iter(_image_cache))]
+    _image_cache[key] = (time.monotonic(), data)
+
+
+async def fetch_image(url: str, params: Dict[str, Any] = None) -> Optional[BytesIO]:
+    """Fetch an image over the shared HTTP session, returning None if it isn't available."""
+    key = (url, tuple(sorted(params.items())) if params else ())
+    cached = _image_cache.get(key)
+    if cached and time.monotonic() - cached[0] < IMAGE_CACHE_TTL:
+        return BytesIO(cached[1])
+    path = _image_cache_path(key)
+    data = await asyncio.to_thread(_read_cached_image, path)
+    if data is None:
+        session = HttpSession.get()
+        async with session.get(url, params=params) as response:
+            if response.status != 200:
+                return None
+            data = await response.read()
+        await asyncio.to_thread(_write_cached_image, path, data)
+    _remember_image(key, data)
+    return BytesIO(data)
 
 
 class NoStopButtonMenuPages(menus.ButtonMenuPages, inherit_buttons=False):
@@ -154,32 +430,43 @@ class NoStopButtonMenuPages(menus.ButtonMenuPages, inherit_buttons=False):
         self._disable_unavailable_buttons()
 
 
+# Shared fields of every "Recently Added" page, filled in per page by format_page
+RECENTLY_ADDED_EMBED = {"type": "rich", "title": "Recently Added", "color": 0xE5A00D}
+
+
 class MyEmbedDescriptionPageSource(menus.ListPageSource):
     def __init__(self, data, tautulli_ip):
         super().__init__(data, per_page=2)
         self.tautulli_ip = tautulli_ip
-
-    async def fetch_image(self, url: str) -> BytesIO:
-        """Fetch image from a URL."""
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    return BytesIO(await response.read())
-                return None
+        self.image_proxy_url = f"http://{tautulli_ip}/pms_image_proxy"
 
     async def format_page(self, menu, entries):
-        embed = nextcord.Embed(title="Recently Added", color=0xE5A00D)
-        embed.set_footer(text=f"Page {menu.current_page + 1}/{self.get_max_pages()}")
-
-        for entry in entries:
-            embed.add_field(name="\u200b", value=entry["description"], inline=False)
-            thumb_key = entry.get("thumb_key", "")
-            if thumb_key:
-                thumb_url = f"http://{self.tautulli_ip}/pms_image_proxy?img={thumb_key}&width=200&height=400&fallback=poster"
-                image_data = await self.fetch_image(thumb_url)
-                if image_data:
-                    file = File(fp=image_data, filename="image.jpg")
-                    embed.set_image(url="attachment://image.jpg")
-                    return {"embed": embed, "file": file}
+        embed = nextcord.Embed.from_dict(
+            {
+                **RECENTLY_ADDED_EMBED,
+                "fields": [
+                    {"name": "\u200b", "value": entry["description"], "inline": False} for entry in entries
+                ],
+                "footer": {"text": f"Page {menu.current_page + 1}/{self.get_max_pages()}"},
+            }
+        )
+
+        # Fetch every thumbnail on the page at once and show the first one that loaded
+        # aiohttp encodes the thumb key, which contains slashes, from the params
+        thumbs = [
+            fetch_image(
+                self.image_proxy_url,
+                params={"img": entry["thumb_key"], "width": 200, "height": 400, "fallback": "poster"},
+            )
+            for entry in entries
+            if entry.get("thumb_key")
+        ]
+        for image_data in await asyncio.gather(*thumbs, return_exceptions=True):
+            if isinstance(image_data, Exception):
+                logger.error(f"Failed to fetch thumbnail: {image_data}")
+            elif image_data:
+                file = File(fp=image_data, filename="image.jpg")
+                embed.set_image(url="attachment://image.jpg")
+                return {"embed": embed, "file": file}
 
         return embed